@@ -5,11 +5,20 @@ Orquestrador do pipeline completo:
 1. Detecção e OCR de placas -> data/result.csv
 2. Interpolação de bounding boxes -> data/result-interpolated.csv
 3. Geração do vídeo final -> media/video-final.mp4
+4. Indexação das placas lidas -> data/plates.db
+
+As etapas 1 e 2 usam o cache em `cache/` (ver `src/cache.py`): se o vídeo, os
+modelos e os parâmetros não mudaram, a etapa 1 reaproveita o `result.csv`
+anterior sem carregar os modelos, e a etapa 2 é pulada quando o `result.csv`
+é o mesmo da última execução.
 """
 
 from scripts.object_identifier import run_object_identifier
 from scripts.interpolate_data import run_interpolation
 from scripts.video_writer import write_video
+from src.plate_index import connect, ingest_csv
+
+import os
 
 if __name__ == "__main__":
     print("=== Etapa 1: Detectando veículos e placas (YOLO + SORT + OCR) ===")
@@ -21,4 +30,17 @@ if __name__ == "__main__":
     print("\n=== Etapa 3: Gerando vídeo final ===")
     write_video()
 
+    print("\n=== Etapa 4: Indexando placas lidas ===")
+    root = os.path.dirname(os.path.abspath(__file__))
+    video_path = os.path.join(root, "media", "video.mp4")
+    # O id padrão inclui o hash do conteúdo: cada vídeo processado como
+    # media/video.mp4 ganha suas próprias leituras no índice, sem apagar as dos
+    # vídeos anteriores
+    conn = connect()
+    n_reads = ingest_csv(conn,
+                         os.path.join(root, "data", "result-interpolated.csv"),
+                         video_path)
+    conn.close()
+    print(f"{n_reads} leitura(s) indexada(s) em data/plates.db")
+
     print("\nPipeline concluído com sucesso! ✅")
@@ -1,6 +1,10 @@
+import argparse
+import csv
+import glob
 import cv2
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from ultralytics import YOLO
 
 # ==============================================================================
@@ -12,38 +16,47 @@ IMAGE_PATH = os.path.join(root, "media", "frame-1.png")
 OUTPUT_DIR = 'academic_results'
 MODEL_PATH = os.path.join(root, "models", "license_plate_detector.pt")
 
-# Garante que a pasta de saída existe
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
+# Extensões consideradas ao receber um diretório como entrada
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
 
-def apply_academic_processing(plate_img, save_prefix):
-    """
-    Aplica o pipeline de pré-processamento e salva os resultados intermediários
-    para o relatório.
+# Quantidade de imagens enviadas de uma vez ao detector de placas
+BATCH_SIZE = 16
+
+
+def apply_academic_processing(plate_img, keep_images=True):
     """
-    print(f"Processando placa detectada...")
+    Aplica o pipeline de pré-processamento e calcula as métricas da análise.
+
+    Não grava nada em disco: as imagens intermediárias são devolvidas para que
+    quem chamou decida se (e quando) salvá-las. Por não depender de estado
+    global, pode ser executada em um pool de processos.
 
+    Args:
+        plate_img (np.ndarray): Recorte BGR da placa.
+        keep_images (bool): Se False, não devolve as imagens intermediárias
+            (quando não serão salvas).
+
+    Returns:
+        tuple: (stats, images), em que `stats` tem a densidade de bordas (Canny),
+        a quantidade de quinas (Harris) e o limiar de Otsu, e `images` é um dict
+        {sufixo_do_arquivo: imagem} (vazio se `keep_images` for False).
+    """
     # 1. UPSCALING (Interpolação Cúbica)
     # Aumenta a resolução para melhorar a detecção de bordas
     h, w = plate_img.shape[:2]
     img_resized = cv2.resize(plate_img, (w * 3, h * 3), interpolation=cv2.INTER_CUBIC)
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_1_upscaled.jpg', img_resized)
 
     # 2. ESCALA DE CINZA
     gray = cv2.cvtColor(img_resized, cv2.COLOR_BGR2GRAY)
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_2_gray.jpg', gray)
 
     # 3. FILTRO BILATERAL (Blur Analysis)
     # Remove ruído preservando bordas (melhor que Gaussian)
     blur = cv2.bilateralFilter(gray, 11, 17, 17)
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_3_bilateral_blur.jpg', blur)
 
     # ---------------------------------------------------------
     # REQUISITO 1: CANNY EDGE DETECTION
     # ---------------------------------------------------------
     edges = cv2.Canny(blur, 100, 200)
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_4_canny_edges.jpg', edges)
-    print(f" - Saved: {save_prefix}_4_canny_edges.jpg")
 
     # ---------------------------------------------------------
     # REQUISITO 2: HARRIS CORNER DETECTION
@@ -52,26 +65,223 @@ def apply_academic_processing(plate_img, save_prefix):
     # Detector de Harris (block_size=2, ksize=3, k=0.04)
     dst = cv2.cornerHarris(gray_float, 2, 3, 0.04)
     dst = cv2.dilate(dst, None) # Dilata para visualizar melhor
-    
-    # Gera imagem visual (pontos vermelhos sobre a imagem original)
-    harris_img = cv2.cvtColor(blur, cv2.COLOR_GRAY2BGR)
-    harris_img[dst > 0.01 * dst.max()] = [0, 0, 255] # Pontos vermelhos
-    
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_5_harris_corners.jpg', harris_img)
-    print(f" - Saved: {save_prefix}_5_harris_corners.jpg")
+    corners = dst > 0.01 * dst.max()
 
     # ---------------------------------------------------------
     # PREPARAÇÃO PARA OCR (Limiarização)
     # ---------------------------------------------------------
     # Sharpening para destacar letras antes do threshold
-    kernel_sharpening = np.array([[-1, -1, -1], 
+    kernel_sharpening = np.array([[-1, -1, -1],
                                   [-1,  9, -1],
                                   [-1, -1, -1]])
     sharp = cv2.filter2D(blur, -1, kernel_sharpening)
-    
+
     # Otsu Thresholding (Binarização Automática)
-    _, thresh = cv2.threshold(sharp, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    cv2.imwrite(f'{OUTPUT_DIR}/{save_prefix}_6_otsu_threshold.jpg', thresh)
+    otsu_threshold, thresh = cv2.threshold(sharp, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    stats = {'edge_density': float(np.count_nonzero(edges)) / edges.size,
+             'harris_corners': int(np.count_nonzero(corners)),
+             'otsu_threshold': float(otsu_threshold)}
+
+    images = {}
+    if keep_images:
+        # Gera imagem visual (pontos vermelhos sobre a imagem original)
+        harris_img = cv2.cvtColor(blur, cv2.COLOR_GRAY2BGR)
+        harris_img[corners] = [0, 0, 255] # Pontos vermelhos
+
+        images = {'original': plate_img,
+                  '1_upscaled': img_resized,
+                  '2_gray': gray,
+                  '3_bilateral_blur': blur,
+                  '4_canny_edges': edges,
+                  '5_harris_corners': harris_img,
+                  '6_otsu_threshold': thresh}
+
+    return stats, images
+
+
+def collect_images(inputs):
+    """
+    Expande a lista de entradas (arquivos, diretórios ou padrões glob) em uma
+    lista ordenada e sem repetições de caminhos de imagens.
+
+    Diretórios são percorridos recursivamente (incluindo subpastas, como
+    `cam1/` e `cam2/`), considerando apenas arquivos com `IMAGE_EXTENSIONS`.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                paths.extend(os.path.join(dirpath, name) for name in filenames
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(set(paths))
+
+
+def artifact_prefix(path, base_dir):
+    """
+    Prefixo dos artefatos de uma imagem: o caminho relativo a `base_dir`, sem extensão.
+
+    Manter as subpastas no prefixo evita que imagens com o mesmo nome em pastas
+    diferentes (ex: `cam1/0001.jpg` e `cam2/0001.jpg`) sobrescrevam os artefatos
+    umas das outras.
+    """
+    rel = os.path.relpath(os.path.abspath(path), base_dir)
+    return os.path.splitext(rel)[0].replace(os.sep, '/')
+
+
+def analyze_plate(plate_img, save_prefix=None):
+    """
+    Analisa uma placa e, se `save_prefix` for informado, grava os artefatos.
+
+    Executada nos processos do pool: as imagens intermediárias são gravadas pelo
+    próprio processo, sem serem copiadas de volta para o processo principal.
+
+    Args:
+        plate_img (np.ndarray): Recorte BGR da placa.
+        save_prefix (str | None): Caminho (sem sufixo) dos artefatos; None para não gravar.
+
+    Returns:
+        tuple: (stats, erros), em que `erros` lista os arquivos que não puderam ser gravados.
+    """
+    stats, images = apply_academic_processing(plate_img, keep_images=save_prefix is not None)
+
+    errors = []
+    if save_prefix is not None:
+        try:
+            os.makedirs(os.path.dirname(save_prefix) or '.', exist_ok=True)
+        except OSError:
+            pass # A falha aparece abaixo, em cada arquivo que não puder ser gravado
+        for suffix, image in images.items():
+            path = f'{save_prefix}_{suffix}.jpg'
+            try:
+                ok = cv2.imwrite(path, image)
+            except cv2.error:
+                ok = False
+            if not ok:
+                errors.append(path)
+    return stats, errors
+
+
+def _finish_image(path, prefix, status, detections, futures):
+    # Aguarda as análises das placas de uma imagem e devolve a linha do resumo
+    stats = []
+    errors = []
+    for future in futures:
+        plate_stats, plate_errors = future.result()
+        stats.append(plate_stats)
+        errors.extend(plate_errors)
+
+    for error_path in errors:
+        print(f"Erro: Não foi possível gravar {error_path}")
+    if status == 'ok' and len(detections) == 0:
+        status = 'no_plate'
+
+    return {'image': path,
+            'artifact_prefix': prefix,
+            'status': status,
+            'n_plates': len(detections),
+            'plate_scores': ';'.join('{:.3f}'.format(d[4]) for d in detections),
+            'plate_bboxes': ';'.join(' '.join(str(int(v)) for v in d[:4]) for d in detections),
+            'edge_density': ';'.join('{:.4f}'.format(s['edge_density']) for s in stats),
+            'harris_corners': ';'.join(str(s['harris_corners']) for s in stats),
+            'otsu_threshold': ';'.join('{:.0f}'.format(s['otsu_threshold']) for s in stats),
+            'write_errors': len(errors)}
+
+
+def analyze_images(image_paths, output_dir=OUTPUT_DIR, save_artifacts=True, batch_size=BATCH_SIZE,
+                   workers=None):
+    """
+    Detecta as placas de várias imagens e aplica a análise acadêmica a cada uma.
+
+    As imagens são enviadas ao detector em lotes de `batch_size`. A análise de
+    cada placa (Canny/Harris/Otsu) e a gravação dos seus artefatos rodam em um
+    pool de processos, sobrepondo-se à detecção do lote seguinte. Como no máximo
+    dois lotes ficam em andamento ao mesmo tempo, a memória não cresce com a
+    quantidade de imagens.
+
+    Os artefatos de cada imagem são gravados em `output_dir`, preservando as
+    subpastas relativas à pasta comum das entradas (ver `artifact_prefix`); o
+    prefixo usado fica registrado na coluna `artifact_prefix` do resumo.
+
+    Args:
+        image_paths (list): Caminhos das imagens.
+        output_dir (str): Pasta de saída (artefatos e `summary.csv`).
+        save_artifacts (bool): Se True, salva as imagens intermediárias de cada placa.
+        batch_size (int): Quantidade de imagens por chamada ao detector.
+        workers (int | None): Processos de análise (padrão: nº de CPUs).
+
+    Returns:
+        str: Caminho do arquivo de resumo gerado.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("Carregando modelo YOLO...")
+    model = YOLO(MODEL_PATH)
+
+    # Pasta comum a todas as entradas, base dos prefixos dos artefatos
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in image_paths])
+
+    summary_path = os.path.join(output_dir, 'summary.csv')
+    header = ['image', 'artifact_prefix', 'status', 'n_plates', 'plate_scores', 'plate_bboxes',
+              'edge_density', 'harris_corners', 'otsu_threshold', 'write_errors']
+
+    with ProcessPoolExecutor(max_workers=workers) as analysis_pool, \
+         ThreadPoolExecutor(max_workers=4) as io_pool, \
+         open(summary_path, 'w', newline='') as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=header)
+        writer.writeheader()
+
+        # Imagens do lote anterior cujas análises ainda estão em andamento
+        pending = []
+
+        for start in range(0, len(image_paths), batch_size):
+            batch_paths = image_paths[start:start + batch_size]
+            batch_imgs = list(io_pool.map(cv2.imread, batch_paths))
+
+            valid = [img for img in batch_imgs if img is not None]
+
+            # Detecção de placas em lote
+            results = iter(model(valid, verbose=False)) if len(valid) > 0 else iter([])
+
+            # Mantém a ordem das entradas, inclusive das imagens que não puderam ser abertas
+            current = []
+            for path, img in zip(batch_paths, batch_imgs):
+                prefix = artifact_prefix(path, base_dir)
+                if img is None:
+                    print(f"Erro: Não foi possível abrir a imagem {path}")
+                    current.append((path, prefix, 'unreadable', [], []))
+                    continue
+
+                detections = []
+                futures = []
+                for detection in next(results).boxes.data.tolist():
+                    x1, y1, x2, y2, score, class_id = detection
+                    # Recortar a placa (Crop), descartando caixas degeneradas
+                    plate_crop = img[max(int(y1), 0):int(y2), max(int(x1), 0):int(x2), :]
+                    if plate_crop.size == 0:
+                        continue
+                    save_prefix = None
+                    if save_artifacts:
+                        save_prefix = os.path.join(output_dir, f'{prefix}_plate_{len(detections)}')
+                    detections.append(detection)
+                    futures.append(analysis_pool.submit(analyze_plate, plate_crop, save_prefix))
+                current.append((path, prefix, 'ok', detections, futures))
+
+            # Finaliza o lote anterior enquanto as análises deste lote rodam
+            for item in pending:
+                writer.writerow(_finish_image(*item))
+            pending = current
+
+            print(f"{min(start + batch_size, len(image_paths))}/{len(image_paths)} imagens processadas")
+
+        for item in pending:
+            writer.writerow(_finish_image(*item))
+
+    return summary_path
 
 
 # ==============================================================================
@@ -79,38 +289,28 @@ def apply_academic_processing(plate_img, save_prefix):
 # ==============================================================================
 def main():
     print("--- GERADOR DE IMAGENS (CANNY/HARRIS) ---")
-    
-    # 1. Carregar Imagem
-    img = cv2.imread(IMAGE_PATH)
-    if img is None:
-        print(f"Erro: Não foi possível abrir a imagem {IMAGE_PATH}")
-        return
 
-    # 2. Carregar Modelo de Detecção de Placas
-    print("Carregando modelo YOLO...")
-    model = YOLO(MODEL_PATH)
-
-    # 3. Detectar Placas
-    results = model(img)[0]
+    parser = argparse.ArgumentParser(description="Análise acadêmica (Canny/Harris/Otsu) das placas detectadas.")
+    parser.add_argument("inputs", nargs="*", default=[IMAGE_PATH],
+                        help="imagens, diretórios (percorridos com as subpastas) ou padrões glob "
+                             "(padrão: media/frame-1.png)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="pasta de saída")
+    parser.add_argument("--no-artifacts", action="store_true", help="não salva as imagens intermediárias")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="imagens por lote do detector")
+    parser.add_argument("--workers", type=int, default=None, help="processos para a análise")
+    args = parser.parse_args()
 
-    if len(results.boxes.data.tolist()) == 0:
-        print("Nenhuma placa detectada na imagem.")
+    image_paths = collect_images(args.inputs)
+    if len(image_paths) == 0:
+        print(f"Erro: Nenhuma imagem encontrada em {args.inputs}")
         return
 
-    # 4. Processar cada placa encontrada
-    for i, detection in enumerate(results.boxes.data.tolist()):
-        x1, y1, x2, y2, score, class_id = detection
-        
-        # Recortar a placa (Crop)
-        plate_crop = img[int(y1):int(y2), int(x1):int(x2), :]
-        
-        # Salvar o crop original para referência
-        cv2.imwrite(f'{OUTPUT_DIR}/plate_{i}_original.jpg', plate_crop)
-        
-        # Aplicar os filtros acadêmicos
-        apply_academic_processing(plate_crop, save_prefix=f"plate_{i}")
-
-    print(f"\nConcluído! Verifique a pasta '{OUTPUT_DIR}' para ver os resultados.")
+    summary_path = analyze_images(image_paths, output_dir=args.output_dir,
+                                  save_artifacts=not args.no_artifacts,
+                                  batch_size=args.batch_size, workers=args.workers)
+
+    print(f"\nConcluído! Verifique a pasta '{args.output_dir}' para ver os resultados "
+          f"e '{summary_path}' para o resumo.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
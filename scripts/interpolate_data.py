@@ -20,6 +20,7 @@ import csv
 import numpy as np
 from scipy.interpolate import interp1d
 import os
+from src.cache import derived_key, file_hash, load_file, save_file
 
 currentDir = os.path.dirname(os.path.abspath(__file__))
 root = os.path.dirname(currentDir)  # sobe 1 nível
@@ -119,9 +120,19 @@ def interpolate_bounding_boxes(data):
 
     return interpolated_data
 
-def run_interpolation():
+def run_interpolation(use_cache=True):
+    input_path = os.path.join(root, "data", "result.csv")
+    output_path = os.path.join(root, "data", "result-interpolated.csv")
+
+    # Se o result.csv e este script não mudaram, reaproveita a saída anterior
+    if use_cache:
+        key = derived_key('interpolation', {'result': file_hash(input_path)}, [os.path.abspath(__file__)])
+        if load_file(key, 'result-interpolated.csv', output_path):
+            print("Entrada inalterada, interpolação reaproveitada do cache.")
+            return
+
     # Carrega o vídeo
-    with open(os.path.join(root, "data", "result.csv"), 'r') as file:
+    with open(input_path, 'r') as file:
         reader = csv.DictReader(file)
         data = list(reader)
 
@@ -130,10 +141,12 @@ def run_interpolation():
 
     # Atualiza os dados no csv
     header = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score', 'license_number', 'license_number_score']
-    with open(os.path.join(root, "data", "result-interpolated.csv"), 'w', newline='') as file:
+    with open(output_path, 'w', newline='') as file:
         writer = csv.DictWriter(file, fieldnames=header)
         writer.writeheader()
         writer.writerows(interpolated_data)
+    if use_cache:
+        save_file(key, output_path, 'result-interpolated.csv')
         
 if __name__ == "__main__":
     run_interpolation()
\ No newline at end of file
@@ -12,101 +12,306 @@ Fluxo geral:
    (`read_license_plate`). Se o OCR retornar uma placa válida, armazena no
    dicionário `results` para posterior exportação.
 
+As detecções YOLO (etapas 1-4) são salvas em `cache/` e reaproveitadas nas
+execuções seguintes enquanto vídeo, modelos e parâmetros não mudarem, de modo
+que ajustes de OCR, interpolação ou renderização não repetem a inferência. O
+`result.csv` também é salvo, com uma chave que inclui o código e os parâmetros
+do pré-processamento e do OCR: se nada disso mudou, a etapa inteira é pulada.
+
+Em vídeos de alta resolução, `vehicle_max_side` reduz o frame apenas para a
+detecção de veículos e `plate_mode` permite procurar placas em recortes do
+frame original (veículos ou ladrilhos), preservando a legibilidade das placas
+(ver `src/multires.py`).
+
 Observações:
 - `vehicles` contém os IDs de classes COCO que representam veículos de interesse.
 - `results` tem a estrutura {frame_nmr: {car_id: {'car': {...}, 'license_plate': {...}}}}
 """
 
 from ultralytics import YOLO
+import ultralytics
+import easyocr
 import cv2
+import inspect
 import os
 import numpy as np
 from sort.sort import *
 from src.util import get_car, read_license_plate, write_csv
-from src.preprocess import preprocess_plate 
+from src.plate_formats import DEFAULT_FORMATS
+from src.preprocess import preprocess_plate
+from src.cache import CacheWriter, cache_key, derived_key, load_detections, load_file, read_crops, save_file
+from src.multires import downscale, scale_boxes, expand_region, tile_grid, detect_in_regions, nms
 
-def run_object_identifier():
-    # Pasta atual
-    currentDir = os.path.dirname(os.path.abspath(__file__))
-    root = os.path.dirname(currentDir)
+# Tamanho de entrada do detector de placas (`imgsz` do treino, ver models/train/args.yaml).
+# Fica fixo aqui porque compõe a chave do cache, calculada antes de carregar o modelo.
+PLATE_IMGSZ = 640
 
-    # Estrutura que irá guardar os resultados (por frame -> por car_id)
-    results = {}
+def _detect_plates(license_plate_detector, frame, vehicle_dets, params):
+    """
+    Detecta placas no frame em resolução total, conforme `params['plate_mode']`:
+    - 'frame': o frame inteiro vai para o detector (ultralytics reduz internamente);
+    - 'vehicles': apenas as regiões dos veículos detectados, recortadas do frame
+      em resolução total, o que preserva a legibilidade de placas pequenas;
+    - 'tiles': o frame é dividido em ladrilhos sobrepostos (cenas muito largas).
 
-    # Inicializa o tracker SORT (mantém estados e IDs entre frames)
-    mot_tracker = Sort()
+    Em todos os modos a entrada da rede tem `params['plate_imgsz']` de lado;
+    regiões maiores que isso também são reduzidas antes da detecção.
+    """
+    mode = params['plate_mode']
+    imgsz = params['plate_imgsz']
+    if mode == 'frame':
+        return license_plate_detector(frame, imgsz=imgsz)[0].boxes.data.tolist()
 
-    # --- Carrega os modelos utilizados ---
+    height, width = frame.shape[:2]
+    if mode == 'vehicles':
+        regions = [expand_region(det, params['vehicle_margin'], width, height)
+                   for det in vehicle_dets if int(det[5]) in params['vehicle_classes']]
+    elif mode == 'tiles':
+        regions = tile_grid(width, height, params['tile_size'], params['tile_overlap'])
+    else:
+        raise ValueError("plate_mode deve ser 'frame', 'vehicles' ou 'tiles', recebido: {!r}".format(mode))
+
+    # A mesma placa pode aparecer em duas regiões sobrepostas
+    return nms(detect_in_regions(license_plate_detector, frame, regions, imgsz=imgsz))
+
+
+def _run_detectors(video_path, vehicle_model_path, plate_model_path, params, cache_writer):
+    """
+    Executa os dois modelos YOLO sobre todos os frames do vídeo.
+
+    Gera, para cada frame, as detecções brutas de veículos e de placas (todas as
+    classes, sem filtro) e o recorte de cada placa. Se `cache_writer` não for
+    None, cada frame é registrado nele para ser salvo no cache.
+
+    Os veículos são detectados no frame reduzido (`params['vehicle_max_side']`)
+    e as caixas mapeadas de volta; placas e recortes usam sempre o frame em
+    resolução total.
+    """
     # Modelo COCO para detectar objetos (usado para detectar veículos)
-    coco_model = YOLO(os.path.join(root, "models", "yolov11n.pt"))
+    coco_model = YOLO(vehicle_model_path)
     # Modelo treinado especificamente para detectar placas
-    license_plate_detector = YOLO(os.path.join(root, "models", "license_plate_detector.pt"))
-
-    # --- Abre o vídeo de entrada ---
-    cap = cv2.VideoCapture(os.path.join(root, "media", "video.mp4"))
+    license_plate_detector = YOLO(plate_model_path)
 
-    # Lista de classes COCO que representam veículos que queremos rastrear
-    vehicles = [2, 3, 5, 7]
+    cap = cv2.VideoCapture(video_path)
 
-    # Loop principal sobre frames
     frame_nmr = -1
     ret = True
     while ret:
         frame_nmr += 1
         ret, frame = cap.read()
         if ret:
-            # Inicializa a chave do frame atual no dicionário de resultados
-            results[frame_nmr] = {}
-
-            # --- Detecção de veículos com o modelo COCO ---
-            detections = coco_model(frame)[0]
-            detections_ = []
-            # Converte o formato retornado pelo ultralytics para o formato esperado pelo tracker
-            for detection in detections.boxes.data.tolist():
-                x1, y1, x2, y2, score, class_id = detection
-                # Filtra apenas classes de veículos (carros, motos, etc.) conforme `vehicles`
-                if int(class_id) in vehicles:
-                    detections_.append([x1, y1, x2, y2, score])
-
-            # --- Atualiza o tracker SORT ---
-            # O tracker espera um array Nx5 (x1, y1, x2, y2, score). Se não houver detecções,
-            # passa um array vazio com a forma correta.
-            if len(detections_) > 0:
-                dets_to_update = np.asarray(detections_)
-            else:
-                dets_to_update = np.empty((0, 5))
-
-            # Atualiza estados do tracker e obtém `track_ids` com formato [[x1,y1,x2,y2,track_id], ...]
-            track_ids = mot_tracker.update(dets_to_update)
-
-            # --- Detecção de placas no frame ---
-            license_plates = license_plate_detector(frame)[0]
-            for license_plate in license_plates.boxes.data.tolist():
-                x1, y1, x2, y2, score, class_id = license_plate
-
-                # Tenta associar a placa detectada a algum carro rastreado
-                xcar1, ycar1, xcar2, ycar2, car_id = get_car(license_plate, track_ids)
-
-                if car_id != -1:
-                    # Se achamos um carro correspondente, recorta a placa do frame
-                    license_plate_crop = frame[int(y1):int(y2), int(x1): int(x2), :]
-
-                    # Pré-processa o recorte para OCR (retorna imagem binarizada)
-                    license_plate_crop_thresh = preprocess_plate(license_plate_crop, car_id, frame_nmr)
-                    
-                    # Lê o texto da placa usando o OCR e normaliza/confia se aplicável
-                    license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_thresh)
-
-                    # Se OCR retornou uma leitura válida, guarda no dicionário resultados
-                    if license_plate_text is not None:
-                        results[frame_nmr][car_id] = {'car': {'bbox': [xcar1, ycar1, xcar2, ycar2]},
-                                                    'license_plate': {'bbox': [x1, y1, x2, y2],
-                                                                        'text': license_plate_text,
-                                                                        'bbox_score': score,
-                                                                        'text_score': license_plate_text_score}}
+            small, scale = downscale(frame, params['vehicle_max_side'])
+            vehicle_dets = scale_boxes(coco_model(small)[0].boxes.data.tolist(), scale)
+            plate_dets = _detect_plates(license_plate_detector, frame, vehicle_dets, params)
+            crops = [frame[int(y1):int(y2), int(x1): int(x2), :]
+                     for x1, y1, x2, y2, _, _ in plate_dets]
+
+            if cache_writer is not None:
+                cache_writer.add_frame(frame_nmr, vehicle_dets, plate_dets, crops)
+
+            yield frame_nmr, vehicle_dets, plate_dets, crops
+
+    cap.release()
+
+
+def _replay_cache(cached, video_path):
+    """
+    Reproduz as detecções de uma entrada do cache, frame a frame.
+
+    Se os recortes das placas estiverem no cache, o vídeo nem é decodificado e
+    os recortes são lidos do disco frame a frame; caso contrário, o vídeo é lido
+    apenas para recortar as placas.
+    """
+    cap = None if cached['crops'] is not None else cv2.VideoCapture(video_path)
+
+    for frame_nmr in range(cached['n_frames']):
+        vehicle_dets = cached['vehicles'].get(frame_nmr, [])
+        plate_dets = cached['plates'].get(frame_nmr, [])
+
+        if cap is None:
+            crops = read_crops(cached, frame_nmr)
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            crops = [frame[int(y1):int(y2), int(x1): int(x2), :]
+                     for x1, y1, x2, y2, _, _ in plate_dets]
+
+        yield frame_nmr, vehicle_dets, plate_dets, crops
+
+    if cap is not None:
+        cap.release()
+
+
+def run_object_identifier(use_cache=True, cache_crops=True, vehicle_max_side=None, plate_mode='frame',
+                          vehicle_margin=0.05, tile_size=None, tile_overlap=0.2, plate_formats=DEFAULT_FORMATS,
+                          plate_imgsz=PLATE_IMGSZ):
+    """
+    Executa detecção, rastreamento e OCR sobre o vídeo de entrada.
+
+    Args:
+        use_cache (bool): Reaproveita as detecções YOLO salvas em `cache/` quando
+            vídeo, modelos e parâmetros não mudaram (ver `src/cache.py`).
+        cache_crops (bool): Salva também os recortes das placas, permitindo que
+            execuções seguintes nem decodifiquem o vídeo.
+        vehicle_max_side (int | None): Se definido, a detecção de veículos roda no
+            frame reduzido para esse tamanho máximo de lado (ex: 1280 para vídeos 4K).
+        plate_mode (str): Onde procurar placas: 'frame' (frame inteiro, padrão),
+            'vehicles' (recortes dos veículos em resolução total) ou 'tiles'
+            (ladrilhos sobrepostos em resolução total). Ver `src/multires.py`.
+        vehicle_margin (float): Margem relativa adicionada aos recortes dos veículos.
+        tile_size (int | None): Lado dos ladrilhos no modo 'tiles' (padrão: `plate_imgsz`,
+            para que os ladrilhos não sejam reduzidos pelo detector).
+        tile_overlap (float): Sobreposição entre ladrilhos vizinhos no modo 'tiles'.
+        plate_formats (tuple): Formatos de placa aceitos pelo OCR, em ordem de
+            prioridade (ex: ('uk', 'mercosul')). Ver `src/plate_formats.py`.
+        plate_imgsz (int): Tamanho de entrada do detector de placas. Recortes de
+            veículos maiores que isso também são reduzidos pelo detector.
+    """
+    # Pasta atual
+    currentDir = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.dirname(currentDir)
+
+    # Estrutura que irá guardar os resultados (por frame -> por car_id)
+    results = {}
+
+    # --- Caminhos dos modelos e do vídeo de entrada ---
+    vehicle_model_path = os.path.join(root, "models", "yolov11n.pt")
+    plate_model_path = os.path.join(root, "models", "license_plate_detector.pt")
+    video_path = os.path.join(root, "media", "video.mp4")
+
+    # Lista de classes COCO que representam veículos que queremos rastrear
+    vehicles = [2, 3, 5, 7]
+
+    # Parâmetros de inferência (também compõem a chave do cache)
+    params = {'ultralytics': ultralytics.__version__,
+              'vehicle_max_side': vehicle_max_side,
+              'plate_mode': plate_mode,
+              'plate_imgsz': plate_imgsz}
+    if plate_mode == 'vehicles':
+        # Só neste modo a lista de classes altera as detecções (define as regiões das placas)
+        params.update({'vehicle_classes': vehicles, 'vehicle_margin': vehicle_margin})
+    elif plate_mode == 'tiles':
+        params.update({'tile_size': tile_size if tile_size is not None else plate_imgsz,
+                       'tile_overlap': tile_overlap})
+
+    result_path = os.path.join(root, "data", "result.csv")
+
+    # --- Consulta o cache de detecções ---
+    # As detecções de veículos são salvas sem filtro de classe
+    cached = None
+    cache_writer = None
+    if use_cache:
+        key = cache_key(video_path, [vehicle_model_path, plate_model_path], params)
+
+        # Se nem as detecções nem o rastreamento/OCR mudaram, reaproveita o result.csv
+        # inteiro e pula a etapa (o EasyOCR nem chega a ser carregado)
+        results_key = _results_key(key, vehicles, plate_formats)
+        if load_file(results_key, 'result.csv', result_path):
+            print("Leituras encontradas no cache, pulando detecção, rastreamento e OCR.")
+            return
+
+        cached = load_detections(key, with_crops=cache_crops)
+
+    if cached is not None:
+        print("Detecções encontradas no cache, pulando a inferência YOLO.")
+        frames = _replay_cache(cached, video_path)
+    else:
+        if use_cache:
+            cache_writer = CacheWriter(key, with_crops=cache_crops)
+        frames = _run_detectors(video_path, vehicle_model_path, plate_model_path, params, cache_writer)
+
+    try:
+        _track_and_read(frames, vehicles, plate_formats, results)
+    except BaseException:
+        # Não deixa uma entrada parcial no cache se a execução for interrompida
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+
+    # Salva as detecções recém-calculadas para as próximas execuções
+    if cache_writer is not None:
+        cache_writer.commit()
 
     # Ao final do processamento de todos os frames, escreve os resultados em CSV
-    write_csv(results, os.path.join(root, "data", "result.csv"))
+    write_csv(results, result_path)
+    if use_cache:
+        save_file(results_key, result_path, 'result.csv')
+
+
+def _results_key(detection_key, vehicles, plate_formats):
+    """
+    Chave do cache do `result.csv`: detecções + parâmetros e código do rastreamento,
+    do pré-processamento e do OCR.
+    """
+    src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    code_paths = [os.path.abspath(__file__),
+                  inspect.getsourcefile(Sort),
+                  os.path.join(src_dir, "preprocess.py"),
+                  os.path.join(src_dir, "util.py"),
+                  os.path.join(src_dir, "plate_formats.py")]
+    return derived_key('ocr',
+                       {'detections': detection_key,
+                        'vehicle_classes': vehicles,
+                        'plate_formats': list(plate_formats),
+                        'easyocr': getattr(easyocr, '__version__', None)},
+                       code_paths)
+
+
+def _track_and_read(frames, vehicles, plate_formats, results):
+    """
+    Rastreia os veículos e lê as placas associadas, preenchendo `results`.
+    """
+    # Inicializa o tracker SORT (mantém estados e IDs entre frames)
+    mot_tracker = Sort()
+
+    # Loop principal sobre frames
+    for frame_nmr, vehicle_dets, plate_dets, crops in frames:
+        # Inicializa a chave do frame atual no dicionário de resultados
+        results[frame_nmr] = {}
+
+        # --- Detecção de veículos com o modelo COCO ---
+        detections_ = []
+        # Converte o formato retornado pelo ultralytics para o formato esperado pelo tracker
+        for detection in vehicle_dets:
+            x1, y1, x2, y2, score, class_id = detection
+            # Filtra apenas classes de veículos (carros, motos, etc.) conforme `vehicles`
+            if int(class_id) in vehicles:
+                detections_.append([x1, y1, x2, y2, score])
+
+        # --- Atualiza o tracker SORT ---
+        # O tracker espera um array Nx5 (x1, y1, x2, y2, score). Se não houver detecções,
+        # passa um array vazio com a forma correta.
+        if len(detections_) > 0:
+            dets_to_update = np.asarray(detections_)
+        else:
+            dets_to_update = np.empty((0, 5))
+
+        # Atualiza estados do tracker e obtém `track_ids` com formato [[x1,y1,x2,y2,track_id], ...]
+        track_ids = mot_tracker.update(dets_to_update)
+
+        # --- Detecção de placas no frame ---
+        for license_plate, license_plate_crop in zip(plate_dets, crops):
+            x1, y1, x2, y2, score, class_id = license_plate
+
+            # Tenta associar a placa detectada a algum carro rastreado
+            xcar1, ycar1, xcar2, ycar2, car_id = get_car(license_plate, track_ids)
+
+            if car_id != -1:
+                # Pré-processa o recorte para OCR (retorna imagem binarizada)
+                license_plate_crop_thresh = preprocess_plate(license_plate_crop, car_id, frame_nmr)
+
+                # Lê o texto da placa usando o OCR e normaliza/confia se aplicável
+                license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_thresh, plate_formats)
+
+                # Se OCR retornou uma leitura válida, guarda no dicionário resultados
+                if license_plate_text is not None:
+                    results[frame_nmr][car_id] = {'car': {'bbox': [xcar1, ycar1, xcar2, ycar2]},
+                                                'license_plate': {'bbox': [x1, y1, x2, y2],
+                                                                    'text': license_plate_text,
+                                                                    'bbox_score': score,
+                                                                    'text_score': license_plate_text_score}}
+
 
 if __name__ == "__main__":
     run_object_identifier()
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Consulta o índice de placas (`data/plates.db`) pela linha de comando.
+
+Exemplos:
+    python -m scripts.search_plates XX12ABC              # busca exata
+    python -m scripts.search_plates XX12 --prefix        # placas que começam com XX12
+    python -m scripts.search_plates XXI2ABC --fuzzy      # tolera confusões do OCR (I/1, A/4, ...)
+
+O índice é alimentado automaticamente pelo `main.py` ao final de cada execução
+(ver `src/plate_index.py`).
+"""
+
+import argparse
+import time
+
+from src.plate_index import DB_PATH, connect, search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca placas no índice local.")
+    parser.add_argument("plate", help="placa (ou início da placa, com --prefix)")
+    parser.add_argument("--prefix", action="store_true", help="busca pelo início da placa")
+    parser.add_argument("--fuzzy", action="store_true", help="ignora confusões do OCR entre letras e dígitos")
+    parser.add_argument("--limit", type=int, default=None, help="quantidade máxima de resultados")
+    parser.add_argument("--db", default=DB_PATH, help="caminho do banco SQLite")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    start = time.perf_counter()
+    try:
+        reads = search(conn, args.plate, mode='prefix' if args.prefix else 'exact', fuzzy=args.fuzzy,
+                       limit=args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        conn.close()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for read in reads:
+        # O tempo fica vazio quando o FPS do vídeo não pôde ser lido na ingestão
+        if read['time_start'] is not None:
+            read['time'] = "{:.1f}s-{:.1f}s".format(read['time_start'], read['time_end'])
+        else:
+            read['time'] = "?"
+        print("{plate}  vídeo={video_id}  car_id={car_id}  frames={frame_start}-{frame_end}  "
+              "tempo={time}  leituras={n_reads}  score={text_score:.2f}".format(**read))
+    print("{} resultado(s) em {:.3f} ms".format(len(reads), elapsed_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,19 @@ Este módulo lê o CSV interpolado (`test_interpolated.csv`), captura frames do
 vídeo correspondente e desenha caixas, placas recortadas e textos das placas
 acima dos veículos. Serve para gerar um vídeo de saída com as placas legíveis
 e com um layout harmônico.
+
+A leitura do vídeo, o desenho das sobreposições e a escrita do vídeo final
+rodam em threads separadas, ligadas por filas de tamanho limitado. A imagem
+sobreposta a cada veículo (texto + recorte da placa) é montada uma única vez e
+apenas copiada nos frames, recortada aos limites da imagem.
 """
 
-import ast
 import cv2
 import numpy as np
 import pandas as pd
 import os
+import queue
+import threading
 
 currentDir = os.path.dirname(os.path.abspath(__file__))
 root = os.path.dirname(currentDir)  # sobe 1 nível
@@ -34,12 +40,169 @@ def draw_border(img, top_left, bottom_right, color=(0, 255, 0), thickness=5, lin
 
     return img
 
-def write_video():
+def parse_bbox(bbox):
+    """
+    Converte um bbox salvo no CSV para uma lista de floats.
+
+    Aceita tanto o formato com colchetes ("[x1 y1 x2 y2]", usado em `result.csv`)
+    quanto o formato sem colchetes ("x1 y1 x2 y2", usado no CSV interpolado),
+    com qualquer quantidade de espaços entre os valores.
+    """
+    return [float(v) for v in bbox.strip().strip('[]').split()]
+
+
+def blit(img, overlay, x, y, alpha=None):
+    """
+    Copia `overlay` sobre `img` com o canto superior esquerdo em (x, y).
+
+    A região é recortada aos limites de `img`, então sobreposições parcialmente
+    (ou totalmente) fora do frame são desenhadas só na parte visível, sem erro.
+
+    Args:
+        img (np.ndarray): Frame BGR de destino (alterado no lugar).
+        overlay (np.ndarray): Imagem BGR a ser desenhada.
+        x, y (int): Posição do canto superior esquerdo do overlay no frame.
+        alpha (np.ndarray | None): Máscara HxWx1 em [0, 1]; None para overlay opaco.
+    """
+    H, W = overlay.shape[:2]
+    img_h, img_w = img.shape[:2]
+
+    # Interseção entre o overlay e o frame
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + W, img_w), min(y + H, img_h)
+    if x1 >= x2 or y1 >= y2:
+        return
+
+    src = overlay[y1 - y:y2 - y, x1 - x:x2 - x]
+    if alpha is None:
+        img[y1:y2, x1:x2] = src
+    else:
+        a = alpha[y1 - y:y2 - y, x1 - x:x2 - x]
+        dst = img[y1:y2, x1:x2]
+        img[y1:y2, x1:x2] = (src * a + dst * (1.0 - a)).astype(img.dtype)
+
+
+def rounded_alpha(height, width, radius=12):
+    """
+    Gera a máscara alfa (HxWx1, em [0, 1]) de um retângulo com cantos arredondados.
+
+    As bordas são desenhadas com anti-aliasing, então os cantos do overlay se
+    misturam suavemente com o frame em vez de ficarem serrilhados.
+    """
+    radius = min(radius, height // 2, width // 2)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(mask, (radius, 0), (width - 1 - radius, height - 1), 255, -1)
+    cv2.rectangle(mask, (0, radius), (width - 1, height - 1 - radius), 255, -1)
+    for cx, cy in ((radius, radius), (width - 1 - radius, radius),
+                   (radius, height - 1 - radius), (width - 1 - radius, height - 1 - radius)):
+        cv2.circle(mask, (cx, cy), radius, 255, -1, lineType=cv2.LINE_AA)
+    return (mask.astype(np.float32) / 255.0)[:, :, None]
+
+
+def build_overlay(license_crop, lp_text, text_bg_height=60):
+    """
+    Monta, uma única vez por veículo, a imagem que é desenhada acima do carro.
+
+    A imagem tem a faixa branca com o texto da placa já renderizado em cima e o
+    recorte da placa (redimensionado e com nitidez realçada) embaixo, com uma
+    máscara alfa de cantos arredondados. Assim o laço de frames só precisa
+    misturar pixels, sem recalcular tamanho de texto, redimensionar ou desenhar
+    texto a cada frame.
+
+    Args:
+        license_crop (np.ndarray | None): Recorte BGR da placa (None se indisponível).
+        lp_text (str): Texto final da placa.
+        text_bg_height (int): Altura da faixa branca do texto.
+
+    Returns:
+        tuple: (imagem BGR com faixa de texto + recorte, máscara alfa HxWx1).
+    """
+    # --- AJUSTE HARMÔNICO ---
+    # 1. Calculamos o tamanho que o texto vai ocupar na tela (para definir largura do crop)
+    (text_width, text_height), _ = cv2.getTextSize(
+        lp_text,
+        cv2.FONT_HERSHEY_SIMPLEX,
+        2.0, # Mesma escala usada no putText abaixo
+        2)
+
+    # 2. Definimos a largura final da imagem baseada no texto + uma margem (padding)
+    # Isso garante que a imagem e o quadrado branco tenham a mesma largura.
+    target_width = text_width + 50 # 50px de margem total
+
+    # Evita que fique muito estreito se o texto for curto (ex: erro de leitura "1")
+    if target_width < 150:
+        target_width = 150
+
+    # 3. Faixa branca com o texto centralizado
+    banner = np.full((text_bg_height, target_width, 3), 255, dtype=np.uint8)
+    cv2.putText(banner,
+                lp_text,
+                (int((target_width - text_width) / 2), int(text_bg_height / 2 + text_height / 2)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                2.0,
+                (0, 0, 0),
+                2)
+
+    if license_crop is None or license_crop.size == 0:
+        return banner, rounded_alpha(*banner.shape[:2])
+
+    # 4. Redimensionamos a imagem para essa largura exata e altura fixa (120)
+    license_crop = cv2.resize(license_crop,
+                            (target_width, 120),
+                            interpolation=cv2.INTER_CUBIC)
+
+    # 5. Sharpening (Nitidez) para melhorar aparência ao sobrepor no vídeo
+    kernel_sharpening = np.array([[0, -1, 0],
+                                [-1, 5, -1],
+                                [0, -1, 0]])
+    license_crop = cv2.filter2D(license_crop, -1, kernel_sharpening)
+
+    overlay = np.vstack((banner, license_crop))
+    return overlay, rounded_alpha(*overlay.shape[:2])
+
+
+def _decode_frames(cap, frames_queue, stop, errors):
+    # Thread de leitura: decodifica os frames e os coloca na fila (None marca o fim)
+    try:
+        ret = True
+        while ret and not stop.is_set():
+            ret, frame = cap.read()
+            if ret:
+                frames_queue.put(frame)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        frames_queue.put(None)
+
+
+def _encode_frames(out, rendered_queue, stop, errors):
+    # Thread de escrita: codifica os frames renderizados (None marca o fim).
+    # Em caso de erro, sinaliza `stop` para que leitura e desenho parem cedo
+    while True:
+        frame = rendered_queue.get()
+        if frame is None:
+            break
+        # Após um erro, continua esvaziando a fila para não travar o renderizador
+        if len(errors) == 0:
+            try:
+                out.write(frame)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+
+def write_video(queue_size=32):
+    """
+    Gera o vídeo final com as placas lidas sobrepostas aos veículos.
+
+    Leitura, desenho e escrita rodam em threads separadas, ligadas por filas de
+    tamanho limitado (`queue_size`), de modo que a decodificação e a codificação
+    do vídeo (que liberam o GIL no OpenCV) acontecem em paralelo ao desenho.
+    """
     # Carrega resultados interpolados (CSV) gerado pelo pipeline
     results = pd.read_csv(os.path.join(root, "data", "result-interpolated.csv"))
 
     # --- Abre o vídeo de entrada e prepara o writer de saída ---
-    video_path = 'sample.mp4'
     video_path = os.path.join(root, "media", "video.mp4")
     cap = cv2.VideoCapture(video_path)
 
@@ -49,126 +212,83 @@ def write_video():
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     out = cv2.VideoWriter(os.path.join(root, "media", "video-final.mp4"), fourcc, fps, (width, height))
 
+    # Seleciona a melhor leitura de placa (maior score) para cada veículo
+    best_rows = results.loc[results.groupby('car_id')['license_number_score'].idxmax()]
 
-    # Dicionário que armazena o crop da placa redimensionado e o texto final para cada car_id
-    license_plate = {}
-    for car_id in np.unique(results['car_id']):
-        # Seleciona a melhor leitura de placa (maior score) para cada veículo
-        max_ = np.amax(results[results['car_id'] == car_id]['license_number_score'])
-
-        # Pega o texto da placa com maior confiança
-        lp_text = results[(results['car_id'] == car_id) &
-                        (results['license_number_score'] == max_)]['license_number'].iloc[0]
-
-        license_plate[car_id] = {'license_crop': None,
-                                'license_plate_number': lp_text}
-
+    # Dicionário com a imagem pronta (texto + placa) e sua máscara alfa para cada car_id.
+    # Percorre os veículos em ordem de frame para que os seeks no vídeo sejam sempre para frente.
+    overlays = {}
+    for _, row in best_rows.sort_values('frame_nmr').iterrows():
         # Posiciona o vídeo no frame onde a placa com maior score foi encontrada
-        cap.set(cv2.CAP_PROP_POS_FRAMES, results[(results['car_id'] == car_id) &
-                                                (results['license_number_score'] == max_)]['frame_nmr'].iloc[0])
+        cap.set(cv2.CAP_PROP_POS_FRAMES, row['frame_nmr'])
         ret, frame = cap.read()
 
-        # Extrai o bbox da placa (string -> tupla de floats)
-        x1, y1, x2, y2 = ast.literal_eval(results[(results['car_id'] == car_id) &
-                                                (results['license_number_score'] == max_)]['license_plate_bbox'].iloc[0].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-
-        license_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
-
-        # --- AJUSTE HARMÔNICO ---
-        # 1. Calculamos o tamanho que o texto vai ocupar na tela (para definir largura do crop)
-        (text_width, text_height), _ = cv2.getTextSize(
-            lp_text,
-            cv2.FONT_HERSHEY_SIMPLEX,
-            2.0, # Mesma escala usada lá embaixo
-            2)
-
-        # 2. Definimos a largura final da imagem baseada no texto + uma margem (padding)
-        # Isso garante que a imagem e o quadrado branco tenham a mesma largura.
-        target_width = text_width + 50 # 50px de margem total
-
-        # Evita que fique muito estreito se o texto for curto (ex: erro de leitura "1")
-        if target_width < 150:
-            target_width = 150
-
-        # 3. Redimensionamos a imagem para essa largura exata e altura fixa (120)
-        license_crop = cv2.resize(license_crop,
-                                (target_width, 120),
-                                interpolation=cv2.INTER_CUBIC)
-
-        # 4. Sharpening (Nitidez) para melhorar aparência ao sobrepor no vídeo
-        kernel_sharpening = np.array([[0, -1, 0],
-                                    [-1, 5, -1],
-                                    [0, -1, 0]])
-        license_crop = cv2.filter2D(license_crop, -1, kernel_sharpening)
-
-        license_plate[car_id]['license_crop'] = license_crop
+        license_crop = None
+        if ret:
+            x1, y1, x2, y2 = parse_bbox(row['license_plate_bbox'])
+            license_crop = frame[max(int(y1), 0):int(y2), max(int(x1), 0):int(x2), :]
 
+        overlays[row['car_id']] = build_overlay(license_crop, str(row['license_number']))
 
-    frame_nmr = -1
+    # Agrupa as linhas por frame uma única vez, já com os bboxes convertidos para inteiros
+    frame_rows = {}
+    for frame_nmr, car_id, car_bbox, lp_bbox in zip(results['frame_nmr'], results['car_id'],
+                                                    results['car_bbox'], results['license_plate_bbox']):
+        frame_rows.setdefault(int(frame_nmr), []).append(
+            (car_id, [int(v) for v in parse_bbox(car_bbox)], [int(v) for v in parse_bbox(lp_bbox)]))
 
     cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
+    # --- Pipeline de threads: leitura -> desenho (thread atual) -> escrita ---
+    errors = []
+    stop = threading.Event()
+    frames_queue = queue.Queue(maxsize=queue_size)
+    rendered_queue = queue.Queue(maxsize=queue_size)
+    decoder = threading.Thread(target=_decode_frames, args=(cap, frames_queue, stop, errors), daemon=True)
+    encoder = threading.Thread(target=_encode_frames, args=(out, rendered_queue, stop, errors), daemon=True)
+    decoder.start()
+    encoder.start()
+
     # Leitura frame-a-frame e sobreposição dos elementos
-    ret = True
-    while ret:
-        ret, frame = cap.read()
-        frame_nmr += 1
-        if ret:
-            # Seleciona as linhas do CSV referentes ao frame atual
-            df_ = results[results['frame_nmr'] == frame_nmr]
-            for row_indx in range(len(df_)):
+    frame_nmr = -1
+    try:
+        while True:
+            frame = frames_queue.get()
+            # Fim do vídeo, ou a escrita falhou e não adianta continuar desenhando
+            if frame is None or stop.is_set():
+                break
+            frame_nmr += 1
+
+            for car_id, (car_x1, car_y1, car_x2, car_y2), (x1, y1, x2, y2) in frame_rows.get(frame_nmr, []):
                 # Desenha borda estilizada do carro
-                car_x1, car_y1, car_x2, car_y2 = ast.literal_eval(df_.iloc[row_indx]['car_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-
-                draw_border(frame, (int(car_x1), int(car_y1)), (int(car_x2), int(car_y2)), (0, 255, 0), thickness=5,
+                draw_border(frame, (car_x1, car_y1), (car_x2, car_y2), (0, 255, 0), thickness=5,
                             line_length_x=50, line_length_y=50)
 
                 # Desenha retângulo vermelho na placa original
-                x1, y1, x2, y2 = ast.literal_eval(df_.iloc[row_indx]['license_plate_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
-
-                # Pega a imagem da placa (já redimensionada para o tamanho do texto)
-                license_crop = license_plate[df_.iloc[row_indx]['car_id']]['license_crop']
-
-                H, W, _ = license_crop.shape
-
-                try:
-                    # Desenha a placa recortada acima do carro, centralizada horizontalmente
-                    frame[int(car_y1) - H - 10 : int(car_y1) - 10,
-                        int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = license_crop
-
-                    # Fundo branco para o texto (usa a mesma largura W da placa redimensionada)
-                    text_bg_height = 60
-                    frame[int(car_y1) - H - 10 - text_bg_height : int(car_y1) - H - 10,
-                        int((car_x2 + car_x1 - W) / 2):int((car_x2 + car_x1 + W) / 2), :] = (255, 255, 255)
-
-                    # Recalcula tamanho do texto apenas para centralizar
-                    (text_width, text_height), _ = cv2.getTextSize(
-                        license_plate[df_.iloc[row_indx]['car_id']]['license_plate_number'],
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        2.0,
-                        2)
-
-                    # Escreve o texto centralizado sobre o fundo branco
-                    cv2.putText(frame,
-                                license_plate[df_.iloc[row_indx]['car_id']]['license_plate_number'],
-                                (int((car_x2 + car_x1 - text_width) / 2), int(car_y1 - H - 10 - (text_bg_height/2) + (text_height/2))),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                2.0,
-                                (0, 0, 0),
-                                2)
-
-                except Exception as e:
-                    # Se algo falhar (por exemplo índices fora da imagem), apenas ignora essa sobreposição
-                    pass
-
-            # Escreve frame no arquivo de saída
-            out.write(frame)
-            # Opcionalmente redimensiona para visualização mais leve (não altera o arquivo escrito)
-            frame = cv2.resize(frame, (1280, 720))
-
-    out.release()
-    cap.release()
-    
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+
+                # Desenha texto + placa acima do carro, centralizados horizontalmente
+                overlay, alpha = overlays[car_id]
+                H, W = overlay.shape[:2]
+                blit(frame, overlay, int((car_x2 + car_x1 - W) / 2), car_y1 - H - 10, alpha)
+
+            # Envia o frame para a thread de escrita
+            rendered_queue.put(frame)
+    finally:
+        rendered_queue.put(None)
+        encoder.join()
+        # Se o desenho foi interrompido, para a leitura e esvazia a fila para liberar a thread
+        stop.set()
+        while decoder.is_alive():
+            try:
+                frames_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        out.release()
+        cap.release()
+
+    if len(errors) > 0:
+        raise errors[0]
+
 if __name__ == "__main__":
     write_video()
\ No newline at end of file
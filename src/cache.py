@@ -0,0 +1,430 @@
+"""
+Cache em disco das detecções YOLO, endereçado por conteúdo.
+
+Rodar os dois modelos YOLO sobre todos os frames é a etapa mais cara do
+pipeline. Como ajustes de OCR, interpolação ou renderização não alteram as
+detecções, este módulo persiste por frame:
+- as detecções brutas de veículos (x1, y1, x2, y2, score, class_id);
+- as detecções brutas de placas (x1, y1, x2, y2, score, class_id);
+- opcionalmente, o recorte BGR de cada placa detectada (gravados em disco
+  à medida que chegam e lidos sob demanda, sem carregar o vídeo todo na memória).
+
+A chave de cada entrada combina o hash do conteúdo do vídeo, o hash de cada
+arquivo de modelo e os parâmetros de inferência. Qualquer alteração em um
+desses itens gera uma chave nova, de modo que entradas antigas nunca são
+reaproveitadas por engano. O diretório do cache tem tamanho máximo e as
+entradas menos usadas recentemente (LRU) são removidas quando ele é excedido.
+
+Estrutura em disco:
+    cache/<chave>/detections.npz   # detecções (e índice dos recortes) com a coluna do frame
+    cache/<chave>/crops.bin        # pixels dos recortes das placas, concatenados (opcional)
+    cache/<chave>/last_used        # marcador de último uso (para o LRU)
+
+O mesmo diretório guarda também as saídas das etapas seguintes (`result.csv`
+do OCR, `result-interpolated.csv` da interpolação), via `save_file`/`load_file`,
+com chaves derivadas das entradas de cada etapa. Assim uma execução refaz
+apenas as etapas posteriores ao que mudou.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+currentDir = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(currentDir)  # sobe 1 nível
+
+CACHE_DIR = os.path.join(root, "cache")
+
+# Tamanho máximo do cache em bytes (padrão: 4 GB)
+MAX_CACHE_BYTES = 4 * 1024 ** 3
+
+# Incrementar quando o formato salvo mudar, invalidando entradas antigas
+CACHE_VERSION = 2
+
+
+# Hashes já calculados nesta execução: {(caminho, tamanho, mtime_ns): hash}
+_hash_memo = {}
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo, lendo em blocos.
+
+    O resultado é memorizado pelo caminho, tamanho e data de modificação do
+    arquivo, de modo que as etapas do pipeline que identificam o mesmo vídeo
+    (cache de detecções e índice de placas) o leem uma única vez.
+
+    Args:
+        path (str): Caminho do arquivo.
+        chunk_size (int): Tamanho de cada bloco lido.
+
+    Returns:
+        str: Hash hexadecimal do conteúdo.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    _hash_memo[memo_key] = h.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def cache_key(video_path, model_paths, params):
+    """
+    Monta a chave do cache a partir do vídeo, dos modelos e dos parâmetros.
+
+    Args:
+        video_path (str): Caminho do vídeo de entrada.
+        model_paths (list): Caminhos dos arquivos de modelo usados.
+        params (dict): Parâmetros de inferência (devem ser serializáveis em JSON).
+
+    Returns:
+        str: Chave hexadecimal da entrada.
+    """
+    payload = {'version': CACHE_VERSION,
+               'video': file_hash(video_path),
+               'models': [file_hash(p) for p in model_paths],
+               'params': params}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def derived_key(stage, inputs, code_paths=()):
+    """
+    Monta a chave do cache de uma etapa posterior à detecção.
+
+    Args:
+        stage (str): Nome da etapa (ex: 'ocr', 'interpolation').
+        inputs (dict): Entradas da etapa (chaves/hashes das etapas anteriores e
+            parâmetros), serializáveis em JSON.
+        code_paths (list): Arquivos de código da etapa; qualquer alteração neles
+            (ex: nos parâmetros do pré-processamento) gera uma chave nova.
+
+    Returns:
+        str: Chave hexadecimal da entrada.
+    """
+    payload = {'version': CACHE_VERSION,
+               'stage': stage,
+               'inputs': inputs,
+               'code': [file_hash(p) for p in code_paths]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _entry_dir(key, cache_dir):
+    return os.path.join(cache_dir, key)
+
+
+def _touch(entry_dir):
+    # Usa um arquivo marcador em vez do atime (muitos sistemas montam com noatime)
+    with open(os.path.join(entry_dir, 'last_used'), 'w') as f:
+        f.write(str(time.time()))
+
+
+def _stack(rows_per_frame, n_cols):
+    # Achata {frame: [[...], ...]} em uma matriz Nx(1 + n_cols) com o frame na 1ª coluna
+    rows = [[frame_nmr] + list(row) for frame_nmr, frame_rows in rows_per_frame.items() for row in frame_rows]
+    if len(rows) == 0:
+        return np.empty((0, 1 + n_cols))
+    return np.asarray(rows, dtype=np.float64)
+
+
+def _unstack(array):
+    rows_per_frame = {}
+    for row in array.tolist():
+        rows_per_frame.setdefault(int(row[0]), []).append(row[1:])
+    return rows_per_frame
+
+
+def load_detections(key, cache_dir=CACHE_DIR, with_crops=False):
+    """
+    Carrega as detecções de uma entrada do cache.
+
+    Os recortes das placas não são lidos aqui: `crops.bin` é mapeado em memória
+    (`np.memmap`) e cada recorte só é lido do disco quando pedido em `read_crops`,
+    de modo que o uso de memória não cresce com a duração do vídeo.
+
+    Args:
+        key (str): Chave gerada por `cache_key`.
+        cache_dir (str): Diretório raiz do cache.
+        with_crops (bool): Se True, exige que os recortes das placas estejam salvos
+            (exceto quando foram descartados por excederem o limite do cache).
+
+    Returns:
+        dict | None: {'n_frames', 'vehicles', 'plates', 'crops'} ou None se não houver
+        entrada (ou se os recortes forem exigidos e não estiverem salvos).
+        `vehicles` e `plates` são {frame_nmr: [[x1, y1, x2, y2, score, class_id], ...]}.
+        `crops` é None ou um dict interno a ser passado para `read_crops`.
+    """
+    entry_dir = _entry_dir(key, cache_dir)
+    detections_path = os.path.join(entry_dir, 'detections.npz')
+    crops_path = os.path.join(entry_dir, 'crops.bin')
+    if not os.path.exists(detections_path):
+        return None
+
+    with np.load(detections_path) as data:
+        cached = {'n_frames': int(data['n_frames']),
+                  'vehicles': _unstack(data['vehicles']),
+                  'plates': _unstack(data['plates']),
+                  'crops': None}
+        crop_index = data['crop_index'] if 'crop_index' in data.files else None
+        crops_skipped = 'crops_skipped' in data.files and bool(data['crops_skipped'])
+
+    # Se os recortes foram descartados por tamanho, a entrada vale sem eles
+    # (o vídeo é decodificado para recortar); refazer a inferência não adiantaria
+    if with_crops and not crops_skipped:
+        if crop_index is None or not os.path.exists(crops_path):
+            return None
+        # Um arquivo vazio não pode ser mapeado (vídeo sem nenhuma placa com área > 0)
+        data = np.memmap(crops_path, dtype=np.uint8, mode='r') if os.path.getsize(crops_path) > 0 else None
+        cached['crops'] = {'data': data, 'index': _unstack(crop_index)}
+
+    _touch(entry_dir)
+    return cached
+
+
+def read_crops(cached, frame_nmr):
+    """
+    Lê do disco os recortes das placas de um frame, na ordem de `cached['plates']`.
+
+    Args:
+        cached (dict): Retorno de `load_detections(..., with_crops=True)`.
+        frame_nmr (int): Número do frame.
+
+    Returns:
+        list: Recortes BGR (arrays somente leitura).
+    """
+    crops = []
+    for offset, h, w in cached['crops']['index'].get(frame_nmr, []):
+        offset, h, w = int(offset), int(h), int(w)
+        if h * w == 0:
+            crops.append(np.zeros((h, w, 3), dtype=np.uint8))
+        else:
+            crops.append(cached['crops']['data'][offset:offset + h * w * 3].reshape(h, w, 3))
+    return crops
+
+
+class CacheWriter:
+    """
+    Grava uma entrada do cache de forma incremental, frame a frame.
+
+    As detecções (pequenas) ficam em memória até `commit`; os recortes das
+    placas são anexados a `crops.bin` assim que chegam, para que a memória não
+    cresça com a duração do vídeo. Tudo é escrito em um diretório temporário e
+    renomeado em `commit`, de modo que uma execução interrompida nunca deixa
+    uma entrada incompleta.
+    """
+
+    def __init__(self, key, cache_dir=CACHE_DIR, with_crops=True, max_bytes=MAX_CACHE_BYTES):
+        self.key = key
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entry_dir = _entry_dir(key, cache_dir)
+        self.tmp_dir = self.entry_dir + '.tmp-{}'.format(os.getpid())
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self.n_frames = 0
+        self.vehicles = {}
+        self.plates = {}
+        # crop_index[frame_nmr] = [[offset, h, w], ...] dentro de crops.bin
+        self.crop_index = {} if with_crops else None
+        self.crops_file = open(os.path.join(self.tmp_dir, 'crops.bin'), 'wb') if with_crops else None
+        self.offset = 0
+        # True quando os recortes passaram de `max_bytes` e deixaram de ser gravados
+        self.crops_skipped = False
+
+    def add_frame(self, frame_nmr, vehicles, plates, crops=None):
+        """
+        Registra as detecções (e os recortes, alinhados com `plates`) de um frame.
+        """
+        self.n_frames = max(self.n_frames, frame_nmr + 1)
+        self.vehicles[frame_nmr] = vehicles
+        self.plates[frame_nmr] = plates
+
+        if self.crops_file is not None:
+            index = []
+            for crop in crops:
+                crop = np.ascontiguousarray(crop, dtype=np.uint8)
+                h, w = crop.shape[:2]
+                self.crops_file.write(crop.tobytes())
+                index.append([self.offset, h, w])
+                self.offset += crop.nbytes
+            self.crop_index[frame_nmr] = index
+
+            # Para de gravar recortes assim que passam do limite, em vez de só
+            # descobrir no `commit` (depois de o disco já ter sido ocupado)
+            if self.offset > self.max_bytes:
+                print("Recortes das placas passaram do limite do cache ({} bytes); "
+                      "salvando apenas as detecções.".format(self.max_bytes))
+                self._drop_crops()
+
+    def _drop_crops(self):
+        self.crops_file.close()
+        os.remove(os.path.join(self.tmp_dir, 'crops.bin'))
+        self.crops_file = None
+        self.crop_index = None
+        self.crops_skipped = True
+
+    def abort(self):
+        """
+        Descarta a entrada em andamento.
+        """
+        if self.crops_file is not None:
+            self.crops_file.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def commit(self):
+        """
+        Finaliza a entrada e aplica a política de remoção LRU.
+
+        Se a entrada sozinha for maior que `max_bytes`, ela é descartada em vez
+        de ocupar o cache inteiro (ou de ultrapassar o limite).
+
+        Returns:
+            bool: True se a entrada foi mantida no cache.
+        """
+        max_bytes = self.max_bytes
+        arrays = {'n_frames': np.asarray(self.n_frames),
+                  'vehicles': _stack(self.vehicles, 6),
+                  'plates': _stack(self.plates, 6),
+                  'crops_skipped': np.asarray(self.crops_skipped)}
+        if self.crops_file is not None:
+            self.crops_file.close()
+            arrays['crop_index'] = _stack(self.crop_index, 3)
+        np.savez(os.path.join(self.tmp_dir, 'detections.npz'), **arrays)
+
+        if _dir_size(self.tmp_dir) > max_bytes:
+            print("Entrada do cache maior que o limite ({} bytes); descartada.".format(max_bytes))
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            return False
+
+        _touch(self.tmp_dir)
+
+        # Substitui uma entrada anterior com a mesma chave (ex: salva antes sem recortes)
+        if os.path.exists(self.entry_dir):
+            shutil.rmtree(self.entry_dir)
+        os.replace(self.tmp_dir, self.entry_dir)
+
+        evict_lru(self.cache_dir, max_bytes, keep=self.key)
+        return True
+
+
+def load_file(key, name, dest_path, cache_dir=CACHE_DIR):
+    """
+    Copia para `dest_path` um arquivo salvo no cache com `save_file`.
+
+    Usado para as saídas das etapas seguintes à detecção (ex: `result.csv`),
+    permitindo pular a etapa inteira quando suas entradas não mudaram.
+
+    Returns:
+        bool: True se o arquivo estava no cache.
+    """
+    entry_dir = _entry_dir(key, cache_dir)
+    cached_path = os.path.join(entry_dir, name)
+    if not os.path.exists(cached_path):
+        return False
+
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    shutil.copyfile(cached_path, dest_path)
+    _touch(entry_dir)
+    return True
+
+
+def save_file(key, src_path, name, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Salva uma cópia de `src_path` no cache, sob a chave `key`.
+    """
+    entry_dir = _entry_dir(key, cache_dir)
+    tmp_dir = entry_dir + '.tmp-{}'.format(os.getpid())
+    os.makedirs(tmp_dir, exist_ok=True)
+    shutil.copyfile(src_path, os.path.join(tmp_dir, name))
+    _touch(tmp_dir)
+
+    if os.path.exists(entry_dir):
+        shutil.rmtree(entry_dir)
+    os.replace(tmp_dir, entry_dir)
+
+    evict_lru(cache_dir, max_bytes, keep=key)
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def _last_used(entry_dir):
+    marker = os.path.join(entry_dir, 'last_used')
+    if os.path.exists(marker):
+        return os.path.getmtime(marker)
+    return os.path.getmtime(entry_dir)
+
+
+# Idade a partir da qual um diretório temporário é considerado abandonado em
+# sistemas onde não é possível consultar se o processo ainda existe
+STALE_TMP_SECONDS = 24 * 60 * 60
+
+
+def _writer_alive(tmp_path):
+    # O diretório temporário termina em '.tmp-<pid>' do processo que o escreve
+    try:
+        pid = int(tmp_path.rsplit('.tmp-', 1)[1])
+    except ValueError:
+        pid = None
+
+    if pid == os.getpid():
+        return True
+    if os.name == 'posix' and pid is not None:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # Existe, mas pertence a outro usuário
+        return True
+    # No Windows `os.kill` encerraria o processo; usa a idade do diretório
+    return time.time() - os.path.getmtime(tmp_path) < STALE_TMP_SECONDS
+
+
+def evict_lru(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """
+    Remove as entradas usadas há mais tempo até o cache caber em `max_bytes`.
+
+    Args:
+        cache_dir (str): Diretório raiz do cache.
+        max_bytes (int): Tamanho máximo permitido.
+        keep (str | None): Chave que nunca deve ser removida (a recém-escrita).
+    """
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        if '.tmp-' in name:
+            # Escrita em andamento; remove apenas as deixadas por processos que
+            # morreram sem chamar `abort` (SIGKILL, falta de memória, ...)
+            if not _writer_alive(path):
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        entries.append((_last_used(path), _dir_size(path), name, path))
+
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, name, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
@@ -0,0 +1,160 @@
+"""
+Utilitários de geometria para inferência em múltiplas resoluções.
+
+O detector de veículos não precisa da resolução total do vídeo (os veículos
+são grandes), enquanto o detector de placas perde legibilidade quando o frame
+inteiro é reduzido para a entrada da rede. As funções deste módulo permitem:
+- reduzir o frame antes da detecção de veículos e mapear as caixas de volta
+  para as coordenadas do frame original;
+- recortar regiões (veículos ou ladrilhos) do frame em resolução total para
+  a detecção de placas e deslocar as caixas encontradas para o frame original;
+- unir as detecções repetidas em regiões sobrepostas (NMS).
+
+Todas as caixas seguem o formato do ultralytics: [x1, y1, x2, y2, score, class_id].
+"""
+
+import cv2
+import numpy as np
+
+
+def downscale(frame, max_side):
+    """
+    Reduz o frame para que o maior lado tenha no máximo `max_side` pixels.
+
+    Args:
+        frame (np.ndarray): Frame BGR em resolução total.
+        max_side (int | None): Tamanho máximo do maior lado (None para não reduzir).
+
+    Returns:
+        tuple: (frame reduzido, escala aplicada). A escala é 1.0 se o frame já
+        for menor que `max_side`.
+    """
+    height, width = frame.shape[:2]
+    if max_side is None or max(height, width) <= max_side:
+        return frame, 1.0
+
+    scale = max_side / max(height, width)
+    small = cv2.resize(frame, (int(round(width * scale)), int(round(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def scale_boxes(dets, scale):
+    """
+    Converte caixas detectadas em um frame reduzido para o frame original.
+    """
+    if scale == 1.0:
+        return dets
+    return [[x1 / scale, y1 / scale, x2 / scale, y2 / scale, score, class_id]
+            for x1, y1, x2, y2, score, class_id in dets]
+
+
+def expand_region(box, margin, width, height):
+    """
+    Expande uma caixa por uma margem relativa e limita aos limites do frame.
+
+    Args:
+        box (list): [x1, y1, x2, y2, ...] em coordenadas do frame.
+        margin (float): Fração do tamanho da caixa adicionada de cada lado.
+        width, height (int): Dimensões do frame.
+
+    Returns:
+        tuple: Região inteira (x1, y1, x2, y2).
+    """
+    x1, y1, x2, y2 = box[:4]
+    dx, dy = (x2 - x1) * margin, (y2 - y1) * margin
+    return (max(int(x1 - dx), 0), max(int(y1 - dy), 0),
+            min(int(x2 + dx), width), min(int(y2 + dy), height))
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Divide o frame em ladrilhos quadrados sobrepostos.
+
+    Os ladrilhos das bordas são deslocados para dentro do frame (em vez de
+    ficarem menores), de modo que todos tenham o mesmo tamanho.
+
+    Args:
+        width, height (int): Dimensões do frame.
+        tile_size (int): Lado de cada ladrilho.
+        overlap (float): Fração de sobreposição entre ladrilhos vizinhos (0 a 1).
+
+    Returns:
+        list: Regiões (x1, y1, x2, y2) de cada ladrilho.
+    """
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        step = max(int(tile_size * (1 - overlap)), 1)
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def detect_in_regions(model, frame, regions, imgsz=None):
+    """
+    Roda o detector em recortes do frame (em lote) e devolve as caixas no frame original.
+
+    O ultralytics redimensiona cada recorte para a entrada da rede (`imgsz`):
+    recortes maiores que ela (ladrilhos grandes, veículos muito próximos da
+    câmera) também são reduzidos, então o ganho de resolução só existe para
+    regiões de até `imgsz` pixels de lado.
+
+    Args:
+        model: Modelo YOLO do ultralytics.
+        frame (np.ndarray): Frame BGR em resolução total.
+        regions (list): Regiões (x1, y1, x2, y2) a recortar.
+        imgsz (int | None): Tamanho de entrada da rede (None para o padrão do ultralytics).
+
+    Returns:
+        list: Caixas [x1, y1, x2, y2, score, class_id] em coordenadas do frame.
+    """
+    regions = [r for r in regions if r[2] > r[0] and r[3] > r[1]]
+    if len(regions) == 0:
+        return []
+
+    crops = [frame[y1:y2, x1:x2, :] for x1, y1, x2, y2 in regions]
+    dets = []
+    for (rx1, ry1, _, _), result in zip(regions, model(crops, imgsz=imgsz)):
+        for x1, y1, x2, y2, score, class_id in result.boxes.data.tolist():
+            dets.append([x1 + rx1, y1 + ry1, x2 + rx1, y2 + ry1, score, class_id])
+    return dets
+
+
+def nms(dets, iou_threshold=0.5):
+    """
+    Supressão de não-máximos: remove caixas repetidas, mantendo a de maior score.
+
+    Necessária quando a mesma placa é detectada em dois recortes sobrepostos
+    (dois veículos próximos ou dois ladrilhos vizinhos).
+
+    Args:
+        dets (list): Caixas [x1, y1, x2, y2, score, class_id].
+        iou_threshold (float): IoU acima do qual duas caixas são consideradas a mesma.
+
+    Returns:
+        list: Caixas mantidas, em ordem decrescente de score.
+    """
+    if len(dets) == 0:
+        return []
+
+    boxes = np.asarray(dets, dtype=np.float64)
+    x1, y1, x2, y2, scores = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-scores)
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+        inter_h = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+        inter = inter_w * inter_h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+
+    return [list(dets[i]) for i in keep]
@@ -0,0 +1,160 @@
+"""
+Formatos de placa definidos por tabela.
+
+Cada formato regional é descrito uma única vez por um `layout`, com uma classe
+de caractere por posição:
+- 'L': letra (dígitos confundíveis são convertidos pela tabela `to_letter`);
+- 'D': dígito (letras confundíveis são convertidas pela tabela `to_digit`);
+- 'A': letra ou dígito (sem conversão).
+
+Na primeira vez em que um formato é usado, ele é compilado em uma tabela
+numpy (posição x código ASCII -> caractere normalizado, ou 0 se inválido). Com
+isso, validar e normalizar todos os candidatos do OCR de uma placa é uma única
+indexação vetorizada, em vez de uma cadeia de `in` por posição e candidato.
+
+O conjunto de caracteres aceitos por um formato também é usado como
+`allowlist` do EasyOCR, restringindo o reconhecimento aos caracteres válidos.
+
+Este módulo não depende do EasyOCR, podendo ser importado por ferramentas que
+só consultam ou validam placas.
+"""
+
+import string
+
+import numpy as np
+
+# Mapas para corrigir confusões comuns entre letras e dígitos
+# Por exemplo, OCR pode reconhecer 'O' quando o correto é o dígito '0'.
+dict_char_to_int = {'O': '0',
+                    'I': '1',
+                    'J': '3',
+                    'A': '4',
+                    'G': '6',
+                    'S': '5'}
+
+dict_int_to_char = {'0': 'O',
+                    '1': 'I',
+                    '3': 'J',
+                    '4': 'A',
+                    '6': 'G',
+                    '5': 'S'}
+
+# Formatos conhecidos. A ordem em uma tupla de formatos define a prioridade
+# quando um candidato é válido em mais de um deles.
+PLATE_FORMATS = {
+    # Reino Unido (ex: AB12CDE) - ver documentacao/padrao-uk.png
+    'uk': {'layout': 'LLDDLLL'},
+    # Brasil, padrão Mercosul (ex: ABC1D23)
+    'mercosul': {'layout': 'LLLDLDD'},
+    # Brasil, padrão anterior ao Mercosul (ex: ABC1234)
+    'br': {'layout': 'LLLDDDD'},
+}
+
+DEFAULT_FORMATS = ('uk',)
+
+_compiled = {}
+
+
+def _compile(name):
+    """
+    Compila um formato de `PLATE_FORMATS` em (tabela, allowlist).
+
+    A tabela tem forma (n_posições, 256) e guarda, para cada posição e código
+    ASCII de entrada, o código do caractere normalizado (0 = inválido).
+    """
+    if name in _compiled:
+        return _compiled[name]
+    if name not in PLATE_FORMATS:
+        raise ValueError("Formato de placa desconhecido: {!r} (disponíveis: {})".format(
+            name, ', '.join(PLATE_FORMATS)))
+
+    spec = PLATE_FORMATS[name]
+    to_letter = spec.get('to_letter', dict_int_to_char)
+    to_digit = spec.get('to_digit', dict_char_to_int)
+
+    table = np.zeros((len(spec['layout']), 256), dtype=np.uint8)
+    for pos, char_class in enumerate(spec['layout']):
+        if char_class == 'L':
+            accepted = {c: c for c in string.ascii_uppercase}
+            accepted.update(to_letter)
+        elif char_class == 'D':
+            accepted = {c: c for c in string.digits}
+            accepted.update(to_digit)
+        elif char_class == 'A':
+            accepted = {c: c for c in string.ascii_uppercase + string.digits}
+        else:
+            raise ValueError("Classe de caractere inválida {!r} no formato {!r}".format(char_class, name))
+
+        for src, dst in accepted.items():
+            table[pos, ord(src)] = ord(dst)
+
+    allowlist = ''.join(sorted(chr(code) for code in np.flatnonzero(table.any(axis=0))))
+    _compiled[name] = (table, allowlist)
+    return _compiled[name]
+
+
+def allowlist(formats=DEFAULT_FORMATS):
+    """
+    Retorna os caracteres aceitos por pelo menos um dos formatos (para o EasyOCR).
+    """
+    return ''.join(sorted(set(''.join(_compile(name)[1] for name in formats))))
+
+
+def match_candidates(texts, formats=DEFAULT_FORMATS):
+    """
+    Valida e normaliza vários candidatos de uma vez.
+
+    Os candidatos são agrupados por tamanho e, para cada formato com aquele
+    tamanho, todos são convertidos por uma única indexação na tabela compilada.
+
+    Args:
+        texts (list): Textos candidatos (já em maiúsculas e sem espaços).
+        formats (tuple): Nomes dos formatos aceitos, em ordem de prioridade.
+
+    Returns:
+        list: Para cada candidato, (texto normalizado, nome do formato), ou
+        (None, None) se não se encaixar em nenhum formato.
+    """
+    matches = [(None, None)] * len(texts)
+
+    by_length = {}
+    for i, text in enumerate(texts):
+        if text.isascii():
+            by_length.setdefault(len(text), []).append(i)
+
+    for name in formats:
+        table, _ = _compile(name)
+        length = table.shape[0]
+        indexes = [i for i in by_length.get(length, []) if matches[i][0] is None]
+        if len(indexes) == 0:
+            continue
+
+        # Matriz (n_candidatos, n_posições) com os códigos ASCII de entrada
+        codes = np.frombuffer(''.join(texts[i] for i in indexes).encode('ascii'),
+                              dtype=np.uint8).reshape(len(indexes), length)
+        mapped = table[np.arange(length), codes]
+        valid = (mapped != 0).all(axis=1)
+
+        for row in np.flatnonzero(valid):
+            matches[indexes[row]] = (mapped[row].tobytes().decode('ascii'), name)
+
+    return matches
+
+
+def best_match(texts, scores, formats=DEFAULT_FORMATS):
+    """
+    Escolhe, entre os candidatos válidos, o de maior score do OCR.
+
+    Args:
+        texts (list): Textos candidatos (já em maiúsculas e sem espaços).
+        scores (list): Score do OCR de cada candidato.
+        formats (tuple): Nomes dos formatos aceitos, em ordem de prioridade.
+
+    Returns:
+        tuple: (texto normalizado, score) ou (None, None) se nenhum for válido.
+    """
+    best_text, best_score = None, None
+    for (text, _), score in zip(match_candidates(texts, formats), scores):
+        if text is not None and (best_score is None or score > best_score):
+            best_text, best_score = text, score
+    return best_text, best_score
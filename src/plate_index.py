@@ -0,0 +1,269 @@
+"""
+Índice local (SQLite) das placas lidas pelo pipeline.
+
+Cada execução do pipeline gera `data/result-interpolated.csv`, com uma linha
+por frame e por veículo. Este módulo funde essas linhas em uma leitura por
+veículo rastreado (`car_id`) e grava o resultado em `data/plates.db`, junto
+com o vídeo de origem, o intervalo de frames/tempo e os scores.
+
+Consultas suportadas (todas via índice B-tree, sem varrer a tabela):
+- exata: placa idêntica à procurada;
+- prefixo: placas que começam com o texto procurado;
+- aproximada: ignora as confusões do OCR entre letras e dígitos (ex: 'O' e
+  '0', 'S' e '5'). Para isso cada placa é salva também em uma forma canônica
+  (`skeleton`), em que os caracteres confundíveis são trocados pelo dígito
+  correspondente; a busca aproximada compara as formas canônicas.
+
+A ingestão é incremental: cada vídeo é identificado por `video_id` e ingerir
+o mesmo vídeo de novo substitui apenas as leituras dele.
+"""
+
+import csv
+import os
+import sqlite3
+import time
+
+import cv2
+
+from src.cache import file_hash
+from src.plate_formats import dict_char_to_int
+
+currentDir = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(currentDir)  # sobe 1 nível
+
+DB_PATH = os.path.join(root, "data", "plates.db")
+
+# Troca cada letra confundível pelo dígito correspondente
+_SKELETON_TABLE = str.maketrans(dict_char_to_int)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id     TEXT PRIMARY KEY,
+    path         TEXT,
+    content_hash TEXT,
+    fps          REAL,
+    ingested_at  REAL
+);
+CREATE TABLE IF NOT EXISTS reads (
+    id          INTEGER PRIMARY KEY,
+    video_id    TEXT NOT NULL REFERENCES videos(video_id),
+    car_id      INTEGER NOT NULL,
+    plate       TEXT NOT NULL,
+    skeleton    TEXT NOT NULL,
+    frame_start INTEGER NOT NULL,
+    frame_end   INTEGER NOT NULL,
+    time_start  REAL,
+    time_end    REAL,
+    n_reads     INTEGER NOT NULL,
+    text_score  REAL,
+    bbox_score  REAL,
+    UNIQUE (video_id, car_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reads_plate ON reads (plate);
+CREATE INDEX IF NOT EXISTS idx_reads_skeleton ON reads (skeleton);
+"""
+
+_COLUMNS = ('video_id', 'car_id', 'plate', 'frame_start', 'frame_end', 'time_start', 'time_end',
+            'n_reads', 'text_score', 'bbox_score')
+
+
+def skeleton(text):
+    """
+    Converte uma placa para a forma canônica usada na busca aproximada.
+
+    Args:
+        text (str): Texto da placa.
+
+    Returns:
+        str: Texto em maiúsculas, sem espaços, com os caracteres confundíveis
+        trocados pelo dígito correspondente (ex: 'SO12ABC' -> '50124BC').
+    """
+    return text.upper().replace(' ', '').translate(_SKELETON_TABLE)
+
+
+def connect(db_path=DB_PATH):
+    """
+    Abre (e cria, se necessário) o banco do índice.
+
+    Args:
+        db_path (str): Caminho do arquivo SQLite.
+
+    Returns:
+        sqlite3.Connection: Conexão com `row_factory` configurado para `sqlite3.Row`.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def fuse_reads(data, fps):
+    """
+    Funde as linhas do CSV interpolado em uma leitura por veículo.
+
+    Linhas imputadas pela interpolação (`license_number == '0'`) contam apenas
+    para o intervalo de frames. Entre as leituras reais, vence o texto com maior
+    soma de scores do OCR (votação ponderada ao longo do rastreamento).
+
+    Args:
+        data (list): Linhas de `result-interpolated.csv` (dicts do `csv.DictReader`).
+        fps (float): Taxa de quadros do vídeo, para converter frames em segundos
+            (se não for positiva, os tempos ficam como None).
+
+    Returns:
+        list: Um dict por veículo com as chaves de `_COLUMNS` (exceto `video_id`).
+    """
+    tracks = {}
+    for row in data:
+        car_id = int(float(row['car_id']))
+        frame_nmr = int(row['frame_nmr'])
+        track = tracks.setdefault(car_id, {'frame_start': frame_nmr, 'frame_end': frame_nmr, 'votes': {}})
+        track['frame_start'] = min(track['frame_start'], frame_nmr)
+        track['frame_end'] = max(track['frame_end'], frame_nmr)
+
+        text = row['license_number']
+        if text == '0':
+            continue
+        text_score = float(row['license_number_score'])
+        bbox_score = float(row['license_plate_bbox_score'])
+        # votes[text] = [soma dos scores, nº de leituras, melhor score, score do bbox da melhor]
+        vote = track['votes'].setdefault(text, [0.0, 0, 0.0, 0.0])
+        vote[0] += text_score
+        vote[1] += 1
+        if text_score > vote[2]:
+            vote[2] = text_score
+            vote[3] = bbox_score
+
+    fused = []
+    for car_id, track in tracks.items():
+        if len(track['votes']) == 0:
+            continue
+        plate, (_, _, text_score, bbox_score) = max(track['votes'].items(), key=lambda item: item[1][0])
+        fused.append({'car_id': car_id,
+                      'plate': plate,
+                      'frame_start': track['frame_start'],
+                      'frame_end': track['frame_end'],
+                      'time_start': track['frame_start'] / fps if fps and fps > 0 else None,
+                      'time_end': track['frame_end'] / fps if fps and fps > 0 else None,
+                      'n_reads': sum(vote[1] for vote in track['votes'].values()),
+                      'text_score': text_score,
+                      'bbox_score': bbox_score})
+    return fused
+
+
+def default_video_id(video_path, video_hash=None):
+    """
+    Monta o identificador padrão de um vídeo: nome do arquivo + início do hash do conteúdo.
+
+    O hash garante que vídeos diferentes gravados com o mesmo nome (ex: sempre
+    `media/video.mp4`) não substituam as leituras uns dos outros no índice, e
+    que reingerir o mesmo vídeo continue substituindo apenas as leituras dele.
+
+    Args:
+        video_path (str): Caminho do vídeo.
+        video_hash (str | None): Hash do conteúdo, se já calculado (`file_hash`).
+
+    Returns:
+        str: Identificador no formato '<nome>-<12 primeiros dígitos do hash>'.
+    """
+    if video_hash is None:
+        video_hash = file_hash(video_path)
+    return '{}-{}'.format(os.path.splitext(os.path.basename(video_path))[0], video_hash[:12])
+
+
+def ingest_csv(conn, csv_path, video_path, video_id=None, fps=None):
+    """
+    Ingere no índice as leituras de uma execução do pipeline.
+
+    Se o vídeo já tiver sido ingerido, suas leituras antigas são substituídas
+    (dentro de uma única transação). Se o conteúdo do vídeo e do CSV não mudou
+    desde a última ingestão, nada é feito.
+
+    Args:
+        conn (sqlite3.Connection): Conexão obtida com `connect`.
+        csv_path (str): Caminho do `result-interpolated.csv`.
+        video_path (str): Caminho do vídeo que originou o CSV.
+        video_id (str | None): Identificador do vídeo (padrão: `default_video_id`).
+        fps (float | None): Taxa de quadros (padrão: lida do próprio vídeo).
+
+    Returns:
+        int: Quantidade de leituras gravadas (0 se nada mudou).
+    """
+    video_hash = file_hash(video_path)
+    if video_id is None:
+        video_id = default_video_id(video_path, video_hash)
+    if fps is None:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+    content_hash = '{}:{}'.format(video_hash, file_hash(csv_path))
+    previous = conn.execute('SELECT content_hash FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+    if previous is not None and previous['content_hash'] == content_hash:
+        return 0
+
+    with open(csv_path, 'r') as file:
+        data = list(csv.DictReader(file))
+    fused = fuse_reads(data, fps)
+
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO videos (video_id, path, content_hash, fps, ingested_at) '
+                     'VALUES (?, ?, ?, ?, ?)',
+                     (video_id, os.path.abspath(video_path), content_hash, fps, time.time()))
+        conn.execute('DELETE FROM reads WHERE video_id = ?', (video_id,))
+        conn.executemany('INSERT INTO reads ({}, skeleton) VALUES ({})'.format(
+                             ', '.join(_COLUMNS), ', '.join('?' * (len(_COLUMNS) + 1))),
+                         [tuple([video_id] + [read[c] for c in _COLUMNS[1:]] + [skeleton(read['plate'])])
+                          for read in fused])
+    return len(fused)
+
+
+def _prefix_upper_bound(prefix):
+    # Menor string maior que todas as que começam com `prefix` (para busca por intervalo)
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search(conn, text, mode='exact', fuzzy=False, limit=None):
+    """
+    Busca leituras no índice.
+
+    Args:
+        conn (sqlite3.Connection): Conexão obtida com `connect`.
+        text (str): Placa (ou início da placa, no modo 'prefix') a procurar. No
+            modo 'prefix', um texto vazio retorna todas as leituras.
+        mode (str): 'exact' para a placa inteira ou 'prefix' para o início dela.
+        fuzzy (bool): Se True, compara pela forma canônica (`skeleton`),
+            tolerando confusões do OCR como 'O'/'0' e 'S'/'5'.
+        limit (int | None): Quantidade máxima de resultados.
+
+    Returns:
+        list: Um dict por leitura, ordenado por vídeo e tempo de início.
+
+    Raises:
+        ValueError: Se `mode` for inválido ou se a busca exata receber texto vazio.
+    """
+    if mode not in ('exact', 'prefix'):
+        raise ValueError("mode deve ser 'exact' ou 'prefix', recebido: {!r}".format(mode))
+
+    column = 'skeleton' if fuzzy else 'plate'
+    value = skeleton(text) if fuzzy else text.upper().replace(' ', '')
+
+    # Intervalo [value, upper) em vez de LIKE, para que o SQLite use o índice
+    if mode == 'exact':
+        if value == '':
+            raise ValueError("A busca exata precisa de uma placa não vazia")
+        where, params = '{} = ?'.format(column), [value]
+    elif value == '':
+        # Prefixo vazio: todas as leituras
+        where, params = '1', []
+    else:
+        where, params = '{0} >= ? AND {0} < ?'.format(column), [value, _prefix_upper_bound(value)]
+
+    query = 'SELECT {} FROM reads WHERE {} ORDER BY video_id, frame_start'.format(', '.join(_COLUMNS), where)
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(int(limit))
+
+    return [dict(row) for row in conn.execute(query, params)]
@@ -3,35 +3,36 @@ Utilitários para leitura e formatação de placas.
 
 Este módulo encapsula o leitor OCR (easyocr) e funções auxiliares para:
 - gravar resultados em CSV;
-- validar o formato da placa lida;
+- validar o formato da placa lida (formatos definidos em `src/plate_formats.py`);
 - aplicar mapeamentos comuns entre caracteres confundidos (ex: 'O' <-> '0').
 
 As funcionalidades aqui são usadas pelo fluxo principal para extrair texto
 de crops de placas e normalizar possíveis confusões entre caracteres.
 """
 
-import string
 import easyocr
 
-# Inicializa o leitor do EasyOCR para o idioma inglês. GPU está desabilitada
-# por padrão para compatibilidade; habilite com gpu=True se tiver GPU e drivers.
-reader = easyocr.Reader(['en'], gpu=False)
+# Os mapas de confusão entre letras e dígitos (`dict_char_to_int`,
+# `dict_int_to_char`) e os formatos de placa ficam em `src/plate_formats.py`;
+# são reexportados aqui por compatibilidade.
+from src.plate_formats import (DEFAULT_FORMATS, PLATE_FORMATS, allowlist, best_match, match_candidates,
+                               dict_char_to_int, dict_int_to_char)
 
-# Mapas para corrigir confusões comuns entre letras e dígitos
-# Por exemplo, OCR pode reconhecer 'O' quando o correto é o dígito '0'.
-dict_char_to_int = {'O': '0',
-                    'I': '1',
-                    'J': '3',
-                    'A': '4',
-                    'G': '6',
-                    'S': '5'}
+# Leitor do EasyOCR para o idioma inglês, criado no primeiro uso (carregar o
+# modelo é lento e desnecessário quando as leituras vêm do cache). GPU está
+# desabilitada por padrão para compatibilidade; habilite com gpu=True se tiver
+# GPU e drivers.
+reader = None
 
-dict_int_to_char = {'0': 'O',
-                    '1': 'I',
-                    '3': 'J',
-                    '4': 'A',
-                    '6': 'G',
-                    '5': 'S'}
+
+def get_reader():
+    """
+    Retorna o leitor do EasyOCR, criando-o na primeira chamada.
+    """
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['en'], gpu=False)
+    return reader
 
 
 def write_csv(results, output_path):
@@ -78,77 +79,57 @@ def write_csv(results, output_path):
                             )
 
 
-def license_complies_format(text):
+def license_complies_format(text, formats=DEFAULT_FORMATS):
     """
     Verifica se um texto possui o formato esperado de placa.
 
-    Regras aplicadas (formato esperado digital/alfanumérico, 7 caracteres):
+    As regras de cada formato (classe de caractere por posição e caracteres
+    que podem ser mapeados) ficam em `PLATE_FORMATS` (`src/plate_formats.py`).
+    Para o formato padrão ('uk', 7 caracteres):
     - posições 0,1,4,5,6: letras (ou dígitos que podem mapear para letras)
     - posições 2,3: dígitos (ou letras que podem mapear para dígitos)
     """
-    if len(text) != 7:
-        return False
-
-    # Checagens por posição, aceitando também os caracteres que podem ser mapeados
-    if (text[0] in string.ascii_uppercase or text[0] in dict_int_to_char.keys()) and \
-       (text[1] in string.ascii_uppercase or text[1] in dict_int_to_char.keys()) and \
-       (text[2] in ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9'] or text[2] in dict_char_to_int.keys()) and \
-       (text[3] in ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9'] or text[3] in dict_char_to_int.keys()) and \
-       (text[4] in string.ascii_uppercase or text[4] in dict_int_to_char.keys()) and \
-       (text[5] in string.ascii_uppercase or text[5] in dict_int_to_char.keys()) and \
-       (text[6] in string.ascii_uppercase or text[6] in dict_int_to_char.keys()):
-        return True
-    else:
-        return False
-
-
-def format_license(text):
+    return match_candidates([text], formats)[0][0] is not None
+
+
+def format_license(text, formats=DEFAULT_FORMATS):
     """
     Aplica mapeamentos posicionais para normalizar a placa.
 
     Algumas posições tendem a ser letras (mas OCR retorna dígitos) e outras
-    tendem a ser dígitos (mas OCR retorna letras). O dicionário `mapping`
-    define qual mapa aplicar em cada posição.
+    tendem a ser dígitos (mas OCR retorna letras). O layout do formato define
+    qual mapa aplicar em cada posição. Textos que não se encaixam em nenhum
+    formato são devolvidos sem alteração.
     """
-    license_plate_ = ''
-    mapping = {0: dict_int_to_char, 1: dict_int_to_char, 4: dict_int_to_char, 5: dict_int_to_char, 6: dict_int_to_char,
-               2: dict_char_to_int, 3: dict_char_to_int}
-    for j in [0, 1, 2, 3, 4, 5, 6]:
-        if text[j] in mapping[j].keys():
-            license_plate_ += mapping[j][text[j]]
-        else:
-            license_plate_ += text[j]
-
-    return license_plate_
+    formatted, _ = match_candidates([text], formats)[0]
+    return formatted if formatted is not None else text
 
 
-def read_license_plate(license_plate_crop):
+def read_license_plate(license_plate_crop, formats=DEFAULT_FORMATS):
     """
     Lê o texto da placa a partir da imagem recortada fornecida.
 
     Args:
         license_plate_crop (PIL.Image.Image): Imagem recortada contendo a placa.
+        formats (tuple): Formatos de placa aceitos (chaves de `PLATE_FORMATS`),
+            em ordem de prioridade.
 
     Returns:
         tuple: Tupla contendo o texto da placa formatado e seu score de confiança.
     """
 
-    # Usa o EasyOCR para ler o crop da placa.
+    # Usa o EasyOCR para ler o crop da placa, restrito aos caracteres que os
+    # formatos aceitos podem conter.
     # `reader.readtext` retorna uma lista de tuples: (bbox, texto, score)
-    detections = reader.readtext(license_plate_crop)
-
-    for detection in detections:
-        bbox, text, score = detection
-
-        # Normaliza o texto para maiúsculas e remove espaços
-        text = text.upper().replace(' ', '')
+    detections = get_reader().readtext(license_plate_crop, allowlist=allowlist(formats))
 
-        # Se o texto cumprir o formato esperado de placa, aplica os mapeamentos
-        if license_complies_format(text):
-            return format_license(text), score
+    # Normaliza o texto para maiúsculas e remove espaços
+    texts = [text.upper().replace(' ', '') for _, text, _ in detections]
+    scores = [score for _, _, score in detections]
 
-    # Se nada válido for encontrado, retorna None
-    return None, None
+    # Valida todos os candidatos de uma vez e escolhe o válido de maior score.
+    # Se nada válido for encontrado, retorna (None, None)
+    return best_match(texts, scores, formats)
 
 
 def get_car(license_plate, vehicle_track_ids):